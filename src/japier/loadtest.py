@@ -0,0 +1,418 @@
+from typing import Any, Callable, Literal, Optional, Type
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import random
+import string
+import threading
+import time
+import sqlalchemy as sa
+import sqlalchemy.event as sa_event
+from flask import Flask, g
+from flask.testing import FlaskClient
+from .service import Service
+from .fields import Field
+from .flask import JapierFlask
+
+
+_CONNECTION_KEY = 'japier_loadtest_connection'
+
+
+ValueGenerator = Callable[['DataGenerator', dict], Any]
+
+Sample = tuple[str, int, float]
+
+WorkerResult = dict[str, Any]
+
+OPERATIONS = ('select_many', 'select', 'insert', 'update', 'delete')
+
+DEFAULT_MIX = {
+    "select_many": 1,
+    "select": 5,
+    "insert": 2,
+    "update": 1,
+    "delete": 1
+}
+
+
+class DataGenerator:
+
+    def __init__(
+            self,
+            coll_cfgs: dict[str, dict],
+            ref_ids: dict[str, list[int]],
+            fan_out: tuple[int, int] = (1, 3),
+            text_length: tuple[int, int] = (4, 16),
+            rng: Optional[random.Random] = None,
+            value_generators: Optional[dict[str, ValueGenerator]] = None
+    ) -> None:
+        self.coll_cfgs = coll_cfgs
+        self.ref_ids = ref_ids
+        self.fan_out = fan_out
+        self.text_length = text_length
+        self.rng = rng or random.Random()
+        self.value_generators = DEFAULT_VALUE_GENERATORS.copy()
+        if value_generators:
+            self.value_generators.update(value_generators)
+
+    def document(self, coll_name: str) -> dict:
+        return self._document_impl(self.coll_cfgs[coll_name])
+
+    def _document_impl(self, coll_cfg: dict) -> dict:
+        return {
+            field_cfg['name']: self.value(field_cfg)
+            for field_cfg in coll_cfg['fields']
+        }
+
+    def value(self, field_cfg: dict) -> Any:
+        value_generator = self.value_generators.get(field_cfg['type'])
+        if value_generator:
+            return value_generator(self, field_cfg)
+        raise Exception(f'Unsupported field type: {field_cfg["type"]}')
+
+
+def _text_value(generator: DataGenerator, field_cfg: dict) -> str:
+    length = generator.rng.randint(*generator.text_length)
+    return ''.join(generator.rng.choices(string.ascii_letters + string.digits, k=length))
+
+
+def _ref_value(generator: DataGenerator, field_cfg: dict) -> int:
+    ref_name = '_'.join(field_cfg['ref_path'])
+    ids = generator.ref_ids.get(ref_name)
+    if not ids:
+        raise Exception(f'No documents to reference in: {ref_name}')
+    return generator.rng.choice(ids)
+
+
+def _collection_value(generator: DataGenerator, field_cfg: dict) -> list[dict]:
+    count = generator.rng.randint(*generator.fan_out)
+    return [generator._document_impl(field_cfg) for _ in range(count)]
+
+
+DEFAULT_VALUE_GENERATORS: dict[str, ValueGenerator] = {
+    "text": _text_value,
+    "ref": _ref_value,
+    "collection": _collection_value
+}
+
+
+def ordered_coll_names(coll_cfgs: dict[str, dict]) -> list[str]:
+    result: list[str] = []
+    visiting: set[str] = set()
+
+    def visit(name: str) -> None:
+        if name in result:
+            return
+        if name in visiting:
+            raise Exception(f'Cyclic references in collection: {name}')
+        visiting.add(name)
+        for ref_name in _ref_targets(coll_cfgs[name]):
+            if ref_name not in coll_cfgs:
+                raise Exception(f'Only top-level collections can be referenced: {ref_name}')
+            if ref_name == name:
+                raise Exception(f'Self-references are not supported: {name}')
+            visit(ref_name)
+        visiting.remove(name)
+        result.append(name)
+
+    for name in coll_cfgs.keys():
+        visit(name)
+    return result
+
+
+def _ref_targets(coll_cfg: dict) -> list[str]:
+    targets = []
+    for field_cfg in coll_cfg['fields']:
+        if field_cfg['type'] == 'collection':
+            targets.extend(_ref_targets(field_cfg))
+        elif field_cfg['type'] == 'ref':
+            targets.append('_'.join(field_cfg['ref_path']))
+    return targets
+
+
+def create_engine(db_url: str) -> sa.Engine:
+    engine = sa.create_engine(db_url)
+    if engine.dialect.name == 'sqlite':
+        sa_event.listen(engine, 'connect', _fk_pragma_on_connect)
+    return engine
+
+
+def _fk_pragma_on_connect(dbapi_con, con_record):
+    dbapi_con.execute('pragma foreign_keys=ON')
+
+
+def create_app(service: Service, engine: sa.Engine) -> Flask:
+    app = Flask(__name__)
+
+    def connection_getter() -> sa.Connection:
+        connection = engine.connect()
+        setattr(g, _CONNECTION_KEY, connection)
+        return connection
+
+    @app.teardown_appcontext
+    def close_connection(exc: Optional[BaseException]) -> None:
+        connection = g.pop(_CONNECTION_KEY, None)
+        if connection is None:
+            return
+        if exc is None:
+            connection.commit()
+        else:
+            connection.rollback()
+        connection.close()
+
+    JapierFlask(service, connection_getter).init_app(app)
+    return app
+
+
+def seed(
+        client: FlaskClient,
+        generator: DataGenerator,
+        coll_names: list[str],
+        count: int
+) -> None:
+    for name in coll_names:
+        ids = generator.ref_ids.setdefault(name, [])
+        for _ in range(count):
+            res = client.post(f"/{name}", json=generator.document(name))
+            if res.status_code != 201:
+                raise Exception(f'Seeding {name} failed with status: {res.status_code}')
+            ids.append(res.get_json()['id'])
+
+
+def _request(client: FlaskClient, samples: list[Sample], route: str, method: str, url: str, **kwargs) -> Any:
+    start = time.perf_counter()
+    res = client.open(url, method=method, **kwargs)
+    samples.append((route, res.status_code, time.perf_counter() - start))
+    return res
+
+
+def run_worker(
+        barrier: Any,
+        coll_cfgs: list[dict],
+        db_url: str,
+        ref_ids: dict[str, list[int]],
+        requests: int,
+        mix: dict[str, int],
+        fan_out: tuple[int, int],
+        rng_seed: Optional[int],
+        fields: Optional[dict[str, Type[Field]]] = None,
+        value_generators: Optional[dict[str, ValueGenerator]] = None
+) -> WorkerResult:
+    try:
+        service = Service(coll_cfgs, fields)
+        engine = create_engine(db_url)
+        client = create_app(service, engine).test_client()
+    except BaseException:
+        barrier.abort()
+        raise
+    rng = random.Random(rng_seed)
+    generator = DataGenerator(service.coll_cfgs, ref_ids, fan_out, rng=rng, value_generators=value_generators)
+    coll_names = list(service.coll_cfgs.keys())
+    operations = list(mix.keys())
+    weights = list(mix.values())
+    # Only documents inserted by this worker are deleted, so seeded documents
+    # that other documents reference are never removed.
+    inserted_ids: dict[str, list[int]] = {name: [] for name in coll_names}
+    samples: list[Sample] = []
+    skipped: dict[str, int] = {}
+    try:
+        # Workers build their apps before the barrier, so that setup is not
+        # counted in the measured window.
+        barrier.wait()
+        start = time.perf_counter()
+        for _ in range(requests):
+            name = rng.choice(coll_names)
+            operation = rng.choices(operations, weights)[0]
+            if operation == 'select_many':
+                _request(client, samples, f"GET /{name}", 'GET', f"/{name}")
+            elif operation == 'select':
+                id_ = rng.choice(ref_ids[name])
+                _request(client, samples, f"GET /{name}/<id>", 'GET', f"/{name}/{id_}")
+            elif operation == 'insert' or (operation == 'delete' and not inserted_ids[name]):
+                if operation == 'delete':
+                    # Nothing of our own to delete yet - insert instead, so the
+                    # request is still sent and the skipped delete is reported.
+                    route = f"DELETE /{name}/<id>"
+                    skipped[route] = skipped.get(route, 0) + 1
+                res = _request(client, samples, f"POST /{name}", 'POST', f"/{name}", json=generator.document(name))
+                if res.status_code == 201:
+                    inserted_ids[name].append(res.get_json()['id'])
+            elif operation == 'update':
+                id_ = rng.choice(ref_ids[name])
+                _request(client, samples, f"PUT /{name}/<id>", 'PUT', f"/{name}/{id_}", json=generator.document(name))
+            elif operation == 'delete':
+                id_ = inserted_ids[name].pop(rng.randrange(len(inserted_ids[name])))
+                _request(client, samples, f"DELETE /{name}/<id>", 'DELETE', f"/{name}/{id_}")
+            else:
+                raise Exception(f'Unsupported operation: {operation}')
+        end = time.perf_counter()
+    finally:
+        engine.dispose()
+    return {
+        "samples": samples,
+        "skipped": skipped,
+        "start": start,
+        "end": end
+    }
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list[Sample], skipped: dict[str, int], elapsed: float) -> dict[str, dict]:
+    routes: dict[str, list[Sample]] = {route: [] for route in skipped.keys()}
+    for sample in samples:
+        routes.setdefault(sample[0], []).append(sample)
+    result = {}
+    for route, route_samples in sorted(routes.items()):
+        durations = [s[2] for s in route_samples]
+        result[route] = {
+            "requests": len(route_samples),
+            "skipped": skipped.get(route, 0),
+            "errors": sum(1 for s in route_samples if s[1] >= 400),
+            "throughput": len(route_samples) / elapsed if elapsed else 0.0,
+            "p50": percentile(durations, 50),
+            "p90": percentile(durations, 90),
+            "p99": percentile(durations, 99),
+            "max": max(durations, default=0.0)
+        }
+    return result
+
+
+def run(
+        coll_cfgs: list[dict],
+        db_url: str,
+        workers: int = 4,
+        mode: Literal['threads', 'processes'] = 'threads',
+        requests: int = 100,
+        seed_count: int = 10,
+        mix: Optional[dict[str, int]] = None,
+        fan_out: tuple[int, int] = (1, 3),
+        rng_seed: Optional[int] = None,
+        fields: Optional[dict[str, Type[Field]]] = None,
+        value_generators: Optional[dict[str, ValueGenerator]] = None
+) -> dict[str, dict]:
+    if mix is None:
+        mix = DEFAULT_MIX
+    for operation, weight in mix.items():
+        if operation not in OPERATIONS:
+            raise Exception(f'Unsupported operation: {operation}')
+        if weight < 0:
+            raise Exception(f'Weight of operation must not be negative: {operation}')
+    if sum(mix.values()) <= 0:
+        raise Exception('Total of operation weights must be greater than zero')
+    if workers < 1:
+        raise Exception('At least one worker is required')
+    if requests < 0:
+        raise Exception('Number of requests must not be negative')
+    if seed_count < 1:
+        raise Exception('At least one document per collection must be seeded')
+    if fan_out[0] < 0 or fan_out[0] > fan_out[1]:
+        raise Exception(f'Invalid fan-out range: {fan_out}')
+    service = Service(coll_cfgs, fields)
+    engine = create_engine(db_url)
+    try:
+        if engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:'):
+            raise Exception('In-memory SQLite cannot be shared between workers, use a database file')
+        # Tables of the configured collections are recreated, so that every
+        # run measures the same freshly seeded dataset.
+        service.metadata.drop_all(engine)
+        service.metadata.create_all(engine)
+        rng = random.Random(rng_seed)
+        ref_ids: dict[str, list[int]] = {}
+        generator = DataGenerator(service.coll_cfgs, ref_ids, fan_out, rng=rng, value_generators=value_generators)
+        seed(create_app(service, engine).test_client(), generator, ordered_coll_names(service.coll_cfgs), seed_count)
+    finally:
+        engine.dispose()
+    with contextlib.ExitStack() as stack:
+        if mode == 'threads':
+            barrier: Any = threading.Barrier(workers)
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+        else:
+            barrier = stack.enter_context(multiprocessing.Manager()).Barrier(workers)
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        futures = [
+            executor.submit(
+                run_worker,
+                barrier,
+                coll_cfgs,
+                db_url,
+                ref_ids,
+                requests,
+                mix,
+                fan_out,
+                None if rng_seed is None else rng_seed + i + 1,
+                fields,
+                value_generators
+            )
+            for i in range(workers)
+        ]
+        errors = [e for e in (f.exception() for f in futures) if e is not None]
+        if errors:
+            # Prefer the error that broke the barrier over the ones it caused.
+            raise next((e for e in errors if not isinstance(e, threading.BrokenBarrierError)), errors[0])
+        results = [f.result() for f in futures]
+    samples = [s for r in results for s in r['samples']]
+    skipped: dict[str, int] = {}
+    for r in results:
+        for route, count in r['skipped'].items():
+            skipped[route] = skipped.get(route, 0) + count
+    elapsed = max(r['end'] for r in results) - min(r['start'] for r in results)
+    return summarize(samples, skipped, elapsed)
+
+
+def format_report(report: dict[str, dict]) -> str:
+    lines = [
+        f"{'route':<40} {'requests':>8} {'skipped':>7} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    ]
+    for route, stats in report.items():
+        lines.append(
+            f"{route:<40} {stats['requests']:>8} {stats['skipped']:>7} {stats['errors']:>6} {stats['throughput']:>9.1f}"
+            f" {stats['p50'] * 1000:>8.2f} {stats['p90'] * 1000:>8.2f}"
+            f" {stats['p99'] * 1000:>8.2f} {stats['max'] * 1000:>8.2f}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m japier.loadtest')
+    parser.add_argument('config', help='JSON file with a list of collection configs')
+    parser.add_argument(
+        '--db-url',
+        default='sqlite:///japier-loadtest.sqlite3',
+        help='database URL; tables of the configured collections are dropped and recreated on every run'
+    )
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--requests', type=int, default=100, help='requests per worker')
+    parser.add_argument('--seed-count', type=int, default=10, help='documents seeded per collection')
+    parser.add_argument('--mix', type=json.loads, default=None, help='JSON object of operation weights')
+    parser.add_argument('--fan-out', type=int, nargs=2, default=(1, 3), metavar=('MIN', 'MAX'))
+    parser.add_argument('--rng-seed', type=int, default=None)
+    args = parser.parse_args(argv)
+    with open(args.config) as f:
+        coll_cfgs = json.load(f)
+    report = run(
+        coll_cfgs,
+        args.db_url,
+        workers=args.workers,
+        mode=args.mode,
+        requests=args.requests,
+        seed_count=args.seed_count,
+        mix=args.mix,
+        fan_out=tuple(args.fan_out),
+        rng_seed=args.rng_seed
+    )
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+import json
+import pathlib
+import random
+import pytest
+import sqlalchemy as sa
+from japier import Service
+from japier.loadtest import DataGenerator, main, ordered_coll_names, percentile, run
+
+
+@pytest.fixture
+def coll_cfgs(service: Service):
+    return list(service.coll_cfgs.values())
+
+
+def test_ordered_coll_names(service: Service):
+    assert ordered_coll_names(service.coll_cfgs) == ['categories', 'computers']
+
+
+def test_ordered_coll_names_self_reference():
+    service = Service(
+        coll_cfgs=[
+            {
+                "name": "nodes",
+                "fields": [
+                    {
+                        "name": "parent_id",
+                        "type": "ref",
+                        "ref_path": ("nodes",),
+                        "cascade_on_delete": True
+                    }
+                ]
+            }
+        ]
+    )
+    with pytest.raises(Exception, match='Self-references are not supported'):
+        ordered_coll_names(service.coll_cfgs)
+
+
+def test_document(service: Service):
+    generator = DataGenerator(
+        service.coll_cfgs,
+        {'categories': [3, 5]},
+        fan_out=(2, 2),
+        rng=random.Random(0)
+    )
+    document = generator.document('computers')
+    assert document['category_id'] in [3, 5]
+    assert len(document['disks']) == 2
+    for disk in document['disks']:
+        assert len(disk['partitions']) == 2
+        for partition in disk['partitions']:
+            assert isinstance(partition['name'], str)
+    assert service.deserialize('computers', document) == document
+
+
+def test_document_without_ref_ids(service: Service):
+    generator = DataGenerator(service.coll_cfgs, {})
+    with pytest.raises(Exception):
+        generator.document('computers')
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+@pytest.mark.parametrize('mode', ['threads', 'processes'])
+def test_run(coll_cfgs: list[dict], tmp_path: pathlib.Path, mode: str):
+    db_path = tmp_path.joinpath('db.sqlite3')
+    report = run(
+        coll_cfgs,
+        f"sqlite:///{db_path}",
+        workers=2,
+        mode=mode,
+        requests=30,
+        seed_count=3,
+        rng_seed=0
+    )
+    assert report
+    for route, stats in report.items():
+        assert route.split(' ')[0] in ['GET', 'POST', 'PUT', 'DELETE']
+        assert stats['errors'] == 0
+        assert stats['requests'] + stats['skipped'] > 0
+        assert stats['p50'] <= stats['p90'] <= stats['p99'] <= stats['max']
+    assert sum(stats['requests'] for stats in report.values()) == 2 * 30
+
+
+def test_run_delete_only(coll_cfgs: list[dict], tmp_path: pathlib.Path):
+    db_path = tmp_path.joinpath('db.sqlite3')
+    report = run(
+        coll_cfgs,
+        f"sqlite:///{db_path}",
+        workers=1,
+        requests=5,
+        seed_count=1,
+        mix={"delete": 1},
+        rng_seed=0
+    )
+    assert sum(stats['requests'] for stats in report.values()) == 5
+    skipped = sum(stats['skipped'] for stats in report.values())
+    assert skipped > 0
+    posts = sum(stats['requests'] for route, stats in report.items() if route.startswith('POST '))
+    assert posts == skipped
+
+
+def test_run_recreates_tables(coll_cfgs: list[dict], tmp_path: pathlib.Path):
+    db_url = f"sqlite:///{tmp_path.joinpath('db.sqlite3')}"
+    for _ in range(2):
+        run(coll_cfgs, db_url, workers=1, requests=5, seed_count=3, mix={"select": 1}, rng_seed=0)
+    engine = sa.create_engine(db_url)
+    with engine.connect() as connection:
+        for name in ['categories', 'computers']:
+            count = connection.execute(sa.select(sa.func.count()).select_from(sa.table(name))).scalar()
+            assert count == 3
+    engine.dispose()
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'mix': {}},
+    {'mix': {'unknown': 1}},
+    {'mix': {'select': 0}},
+    {'mix': {'select': 2, 'insert': -1}},
+    {'workers': 0},
+    {'requests': -1},
+    {'seed_count': 0},
+    {'fan_out': (3, 1)},
+    {'db_url': 'sqlite://'},
+    {'db_url': 'sqlite:///:memory:'}
+])
+def test_run_invalid_args(coll_cfgs: list[dict], tmp_path: pathlib.Path, kwargs: dict):
+    db_path = tmp_path.joinpath('db.sqlite3')
+    with pytest.raises(Exception):
+        run(coll_cfgs, **{'db_url': f"sqlite:///{db_path}", **kwargs})
+    assert not db_path.exists()
+
+
+def test_main(coll_cfgs: list[dict], tmp_path: pathlib.Path, capsys: pytest.CaptureFixture):
+    config_path = tmp_path.joinpath('config.json')
+    config_path.write_text(json.dumps(coll_cfgs))
+    db_path = tmp_path.joinpath('db.sqlite3')
+    main([
+        str(config_path),
+        '--db-url', f"sqlite:///{db_path}",
+        '--workers', '2',
+        '--requests', '10',
+        '--seed-count', '2',
+        '--mix', '{"select": 1, "insert": 1}',
+        '--fan-out', '1', '2',
+        '--rng-seed', '0'
+    ])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ['route', 'requests', 'skipped', 'errors', 'req/s', 'p50', 'ms', 'p90', 'ms', 'p99', 'ms', 'max', 'ms']
+    rows = [line.split() for line in lines[1:]]
+    assert rows
+    for row in rows:
+        assert row[0] in ['GET', 'POST']
+        assert row[3] == '0'
+        assert row[4] == '0'
+    assert sum(int(row[2]) for row in rows) == 2 * 10